@@ -1,12 +1,15 @@
 import os
 import sys
 import argparse
+import queue
 import optuna
 import numpy as np
+import torch
 import uvicorn
 from fastapi import FastAPI
 from stable_baselines3 import PPO
 from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.vec_env import SubprocVecEnv
 from stable_baselines3.common.callbacks import BaseCallback
 
 # Add src to sys.path
@@ -24,22 +27,17 @@ class FarkleMetricsCallback(BaseCallback):
         self.turns_ended = 0
         self.wins = 0
         self.games_ended = 0
+        self.last_legal_ratio = 0
 
     def _on_step(self) -> bool:
-        for info in self.locals['infos']:
-            if info.get('legal_move'):
-                self.legal_moves += 1
-            self.total_moves += 1
-            
-            if "turn_points" in info:
-                self.total_points += info["turn_points"]
-                self.turns_ended += 1
-            
-            if info.get("win"):
-                self.wins += 1
-                self.games_ended += 1
-            elif self.locals['dones'][0]: # Simplified game end check
-                self.games_ended += 1
+        infos = self.locals['infos']
+        for info, done in zip(infos, self.locals['dones']):
+            self.legal_moves += info["legal_move"]
+            self.turns_ended += info["turn_ended"]
+            self.total_points += info["turn_points"]
+            self.wins += info["win"]
+            self.games_ended += done
+        self.total_moves += len(infos)
         return True
 
     def _on_rollout_end(self) -> None:
@@ -50,6 +48,7 @@ class FarkleMetricsCallback(BaseCallback):
         self.logger.record("train/legal_move_ratio", legal_ratio)
         self.logger.record("train/avg_points_per_turn", avg_points)
         self.logger.record("train/win_percentage", win_rate * 100)
+        self.last_legal_ratio = legal_ratio
         
         # Reset for next rollout
         self.legal_moves = 0
@@ -63,12 +62,67 @@ class FarkleMetricsCallback(BaseCallback):
     def legal_ratio(self):
         return self.legal_moves / self.total_moves if self.total_moves > 0 else 0
 
+class TrialPruningCallback(FarkleMetricsCallback):
+    """Reports each rollout's legal move ratio to Optuna and stops the run once the trial is pruned."""
+
+    def __init__(self, trial, verbose=0):
+        super(TrialPruningCallback, self).__init__(verbose)
+        self.trial = trial
+        self.rollouts = 0
+        self.is_pruned = False
+
+    def _on_step(self) -> bool:
+        super()._on_step()
+        return not self.is_pruned
+
+    def _on_rollout_end(self) -> None:
+        super()._on_rollout_end()
+        self.rollouts += 1
+        self.trial.report(self.last_legal_ratio, self.rollouts)
+        self.is_pruned = self.trial.should_prune()
+
 def count_parameters(model):
     return sum(p.numel() for p in model.policy.parameters() if p.requires_grad)
 
+def usable_cpus():
+    # Honour CPU affinity / cgroup pinning where the platform exposes it
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def make_farkle_vec_env(penalty, n_envs=8, subproc=True):
+    # FarkleEnv.step only takes a few µs, so worker processes only pay for their IPC when
+    # every env and the learner get a core of their own; otherwise step them in-process
+    if not subproc or n_envs >= usable_cpus():
+        return make_vec_env(lambda: FarkleEnv(illegal_action_penalty=penalty), n_envs=n_envs)
+    return make_vec_env(
+        lambda: FarkleEnv(illegal_action_penalty=penalty),
+        n_envs=n_envs,
+        vec_env_cls=SubprocVecEnv,
+        vec_env_kwargs={"start_method": "forkserver"},
+    )
+
+# Tuning vec envs keyed by worker slot; trials only differ in the penalty, so the
+# envs are kept and reused instead of rebuilt every trial
+_TUNE_ENVS = {}
+
+def get_tune_env(slot, penalty):
+    env = _TUNE_ENVS.get(slot)
+    if env is None:
+        env = _TUNE_ENVS[slot] = make_farkle_vec_env(penalty, n_envs=4, subproc=False)
+    else:
+        env.env_method("set_illegal_action_penalty", penalty)
+    return env
+
+def close_tune_envs():
+    for env in _TUNE_ENVS.values():
+        env.close()
+    _TUNE_ENVS.clear()
+
 # --- Optuna Objective ---
 
-def objective(trial, tune_timesteps=200000):
+def objective(trial, tune_timesteps=200000, device="auto", slot=0):
     lr = trial.suggest_float("learning_rate", 1e-4, 5e-3, log=True)
     ent_coef = trial.suggest_float("ent_coef", 0.001, 0.1, log=True)
     clip_range = trial.suggest_float("clip_range", 0.1, 0.4)
@@ -82,35 +136,66 @@ def objective(trial, tune_timesteps=200000):
     net_arch = [layer_size] * n_layers
     policy_kwargs = dict(net_arch=dict(pi=net_arch, vf=net_arch))
 
-    env = make_vec_env(lambda: FarkleEnv(illegal_action_penalty=penalty), n_envs=4)
+    env = get_tune_env(slot, penalty)
     model = PPO(
         "MlpPolicy", env, verbose=0,
         learning_rate=lr, ent_coef=ent_coef,
         clip_range=clip_range, n_steps=n_steps,
         batch_size=batch_size,
         policy_kwargs=policy_kwargs,
-        tensorboard_log="./tensorboard/"
+        tensorboard_log="./tensorboard/",
+        device=device
     )
     
     params_count = count_parameters(model)
-    print(f"🔹 Trial {trial.number}: Layers={n_layers}, Size={layer_size}, Params={params_count:,}")
+    print(f"🔹 Trial {trial.number}: Layers={n_layers}, Size={layer_size}, Params={params_count:,}, Device={device}")
 
     # Use full metrics callback even for tuning to see progress in TensorBoard
-    metrics_callback = FarkleMetricsCallback()
+    metrics_callback = TrialPruningCallback(trial)
     model.learn(
         total_timesteps=tune_timesteps, 
         callback=metrics_callback,
         tb_log_name=f"trial_{trial.number}"
     )
+    if metrics_callback.is_pruned:
+        raise optuna.TrialPruned()
     
-    return metrics_callback.legal_ratio # We need to use the property from the callback
+    # Counters are reset at every rollout end, so score the last completed rollout
+    return metrics_callback.last_legal_ratio
 
 # --- Actions ---
 
-def run_tune(trials=10, final_timesteps=500000, tune_timesteps=200000):
-    print(f"🚀 Starting AutoML Tuning ({trials} trials, {tune_timesteps} steps each)...")
-    study = optuna.create_study(direction="maximize")
-    study.optimize(lambda t: objective(t, tune_timesteps), n_trials=trials)
+def run_tune(trials=10, final_timesteps=500000, tune_timesteps=200000, n_jobs=None, storage="sqlite:///optuna.db", n_envs=8):
+    n_gpus = torch.cuda.device_count()
+    if n_jobs is None:
+        n_jobs = max(n_gpus, 1)
+    print(f"🚀 Starting AutoML Tuning ({trials} trials, {tune_timesteps} steps each, {n_jobs} parallel)...")
+    # Persistent storage lets several `tune` processes (e.g. one per CPU box) share one study
+    if storage.startswith("sqlite"):
+        # Parallel workers contend for the SQLite write lock; wait instead of failing
+        storage = optuna.storages.RDBStorage(storage, engine_kwargs={"connect_args": {"timeout": 300}})
+    study = optuna.create_study(
+        direction="maximize", study_name="farkle", storage=storage, load_if_exists=True,
+        pruner=optuna.pruners.MedianPruner(n_warmup_steps=5),
+        sampler=optuna.samplers.TPESampler(multivariate=True),
+    )
+
+    # One (slot, device) pair per parallel trial; GPUs are handed out round-robin
+    slots = queue.Queue()
+    for i in range(n_jobs):
+        slots.put((i, f"cuda:{i % n_gpus}" if n_gpus else "cpu"))
+
+    def slot_objective(trial):
+        slot, device = slots.get()
+        try:
+            return objective(trial, tune_timesteps, device=device, slot=slot)
+        finally:
+            slots.put((slot, device))
+
+    try:
+        study.optimize(slot_objective, n_trials=trials, n_jobs=n_jobs)
+    finally:
+        close_tune_envs()
 
     print("\n🏆 Best Hyperparameters:")
     for key, value in study.best_params.items():
@@ -123,7 +208,7 @@ def run_tune(trials=10, final_timesteps=500000, tune_timesteps=200000):
     net_arch = [best['layer_size']] * best['n_layers']
     policy_kwargs = dict(net_arch=dict(pi=net_arch, vf=net_arch))
     
-    env = make_vec_env(lambda: FarkleEnv(illegal_action_penalty=best['illegal_action_penalty']), n_envs=8)
+    env = make_farkle_vec_env(best['illegal_action_penalty'], n_envs=n_envs)
     model = PPO(
         "MlpPolicy", env, verbose=1,
         learning_rate=best['learning_rate'],
@@ -137,14 +222,15 @@ def run_tune(trials=10, final_timesteps=500000, tune_timesteps=200000):
     
     metrics_callback = FarkleMetricsCallback()
     model.learn(total_timesteps=final_timesteps, callback=metrics_callback, tb_log_name="PPO_Optimized")
+    env.close()
     
     os.makedirs("checkpoints", exist_ok=True)
     model.save("checkpoints/farkle_ppo_optimized")
     print(f"\n✅ Optimized model saved to checkpoints/farkle_ppo_optimized")
 
-def run_train(timesteps=500000, output="farkle_ppo_manual", penalty=100.0):
+def run_train(timesteps=500000, output="farkle_ppo_manual", penalty=100.0, n_envs=8):
     print(f"🏋️ Starting Manual Training for {timesteps} steps (Penalty: {penalty})...")
-    env = make_vec_env(lambda: FarkleEnv(illegal_action_penalty=penalty), n_envs=8)
+    env = make_farkle_vec_env(penalty, n_envs=n_envs)
     model = PPO(
         "MlpPolicy", env, verbose=1,
         learning_rate=3e-4,
@@ -153,6 +239,7 @@ def run_train(timesteps=500000, output="farkle_ppo_manual", penalty=100.0):
     
     metrics_callback = FarkleMetricsCallback()
     model.learn(total_timesteps=timesteps, callback=metrics_callback, tb_log_name="PPO_Manual")
+    env.close()
     
     os.makedirs("checkpoints", exist_ok=True)
     model.save(f"checkpoints/{output}")
@@ -183,12 +270,16 @@ if __name__ == "__main__":
     tune_parser.add_argument("--trials", type=int, default=8)
     tune_parser.add_argument("--timesteps", type=int, default=500000)
     tune_parser.add_argument("--tune-timesteps", type=int, default=200000)
+    tune_parser.add_argument("--jobs", type=int, default=None, help="Parallel trials (defaults to one per GPU)")
+    tune_parser.add_argument("--storage", type=str, default="sqlite:///optuna.db")
+    tune_parser.add_argument("--n-envs", type=int, default=8, help="Parallel envs for the final training run")
 
     # Train
     train_parser = subparsers.add_parser("train", help="Run standard training")
     train_parser.add_argument("--timesteps", type=int, default=500000)
     train_parser.add_argument("--output", type=str, default="farkle_ppo_manual")
     train_parser.add_argument("--penalty", type=float, default=100.0)
+    train_parser.add_argument("--n-envs", type=int, default=8)
 
     # API
     api_parser = subparsers.add_parser("api", help="Start the agent API")
@@ -198,9 +289,10 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     if args.command == "tune":
-        run_tune(trials=args.trials, final_timesteps=args.timesteps, tune_timesteps=args.tune_timesteps)
+        run_tune(trials=args.trials, final_timesteps=args.timesteps, tune_timesteps=args.tune_timesteps,
+                 n_jobs=args.jobs, storage=args.storage, n_envs=args.n_envs)
     elif args.command == "train":
-        run_train(timesteps=args.timesteps, output=args.output, penalty=args.penalty)
+        run_train(timesteps=args.timesteps, output=args.output, penalty=args.penalty, n_envs=args.n_envs)
     elif args.command == "api":
         run_api(port=args.port, model_path=args.model)
     else:
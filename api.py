@@ -1,6 +1,7 @@
 import os
 import sys
 import numpy as np
+import torch
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,19 +16,41 @@ import farkle_core
 # Model path
 MODEL_PATH = "checkpoints/farkle_ppo_mvp.zip"
 model = None
+# TorchScript actor traced from `model` at startup; used instead of model.predict
+policy = None
+
+class ActorLogits(torch.nn.Module):
+    """Actor half of an SB3 ActorCriticPolicy, mapping observations to action logits."""
+
+    def __init__(self, sb3_policy):
+        super().__init__()
+        self.features_extractor = sb3_policy.pi_features_extractor
+        self.policy_net = sb3_policy.mlp_extractor.policy_net
+        self.action_net = sb3_policy.action_net
+
+    def forward(self, obs):
+        return self.action_net(self.policy_net(self.features_extractor(obs)))
+
+def export_policy(model):
+    # Deterministic predict() is the argmax of these logits, minus SB3's per-call overhead
+    actor = ActorLogits(model.policy).eval()
+    with torch.no_grad():
+        return torch.jit.trace(actor, torch.zeros(1, 16))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Load the ML model
-    global model
+    global model, policy
     if os.path.exists(MODEL_PATH):
-        model = PPO.load(MODEL_PATH)
+        model = PPO.load(MODEL_PATH, device="cpu")
+        policy = export_policy(model)
         print(f"Model loaded from {MODEL_PATH}")
     else:
         print(f"Model not found at {MODEL_PATH}. API will return random moves.")
     yield
     # Clean up the ML model and release the resources
     model = None
+    policy = None
 
 app = FastAPI(title="Zehntausend Custom Agent API", lifespan=lifespan)
 
@@ -64,17 +87,32 @@ class AgentMove(BaseModel):
     keepDiceIds: List[int]
     explanation: Optional[str] = None
 
-def get_obs_from_state(state: GameState):
+# Normalised die state, i.e. the {rolled: 0, kept: 1, banked: 2} encoding divided by 2.0
+_STATE_LUT = {"rolled": 0.0, "kept": 0.5, "banked": 1.0}
+
+# Die positions selected by each of the 64 keep masks, decoded once at import
+_MASK_BITS = [[i for i in range(6) if (m >> i) & 1] for m in range(64)]
+
+def index_dice_by_id(dice: List[Die]) -> List[Optional[Die]]:
+    # Dice IDs are observation slots 0-5, so place each die at its ID instead of sorting
+    dice_by_id = [None] * 6
+    for d in dice:
+        if 0 <= d.id < 6:
+            dice_by_id[d.id] = d
+    return dice_by_id
+
+def get_obs_from_state(state: GameState, dice_by_id: Optional[List[Optional[Die]]] = None):
     obs = np.zeros(16, dtype=np.float32)
-    state_map = {"rolled": 0, "kept": 1, "banked": 2}
     
-    # Sort dice by ID to ensure consistent mapping to the observation vector
-    sorted_dice = sorted(state.dice, key=lambda d: d.id)
+    # Callers that already indexed the dice can pass them in to avoid redoing it
+    if dice_by_id is None:
+        dice_by_id = index_dice_by_id(state.dice)
     
-    for d in state.dice:
-        if d.id < 6:
-            obs[d.id] = d.value / 6.0
-            obs[d.id + 6] = state_map.get(d.state, 0) / 2.0
+    # Missing dice stay zero; states map straight to their normalised value
+    for i, d in enumerate(dice_by_id):
+        if d is not None:
+            obs[i] = d.value / 6.0
+            obs[i + 6] = _STATE_LUT.get(d.state, 0.0)
     
     # Identify which player is "me"
     me = next((p for p in state.players if p.isMyTurn), state.players[0])
@@ -89,13 +127,17 @@ def get_obs_from_state(state: GameState):
 
 @app.post("/move", response_model=AgentMove)
 async def get_move(state: GameState):
-    global model
+    global model, policy
     
-    # Sort once here to use for both observation and action mapping
-    sorted_dice = sorted(state.dice, key=lambda d: d.id)
+    # Index once here to use for both observation and action mapping
+    dice_by_id = index_dice_by_id(state.dice)
     
-    if model:
-        obs = get_obs_from_state(state)
+    if policy is not None:
+        obs = torch.from_numpy(get_obs_from_state(state, dice_by_id)).unsqueeze(0)
+        with torch.no_grad():
+            action = int(policy(obs).argmax(-1))
+    elif model:
+        obs = get_obs_from_state(state, dice_by_id)
         action, _states = model.predict(obs, deterministic=True)
     else:
         # Fallback to random if no model
@@ -104,15 +146,12 @@ async def get_move(state: GameState):
     is_bank = action >= 64
     mask = action % 64
     
-    keep_dice_ids = []
-    for i in range(min(6, len(sorted_dice))):
-        if (mask >> i) & 1:
-            keep_dice_ids.append(sorted_dice[i].id)
+    keep_dice_ids = [i for i in _MASK_BITS[mask] if dice_by_id[i] is not None]
     
     return AgentMove(
         action="BANK" if is_bank else "ROLL",
         keepDiceIds=keep_dice_ids,
-        explanation=f"RL Agent decision (mask={mask}, total_dice={len(sorted_dice)})"
+        explanation=f"RL Agent decision (mask={mask}, total_dice={len(state.dice)})"
     )
 
 if __name__ == "__main__":
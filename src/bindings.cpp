@@ -1,9 +1,13 @@
 #include "farkle_core.cpp"
+#include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 
 namespace py = pybind11;
 
+static_assert(sizeof(DieState) == sizeof(int32_t),
+              "dice_view exposes DieState as an int32 field");
+
 PYBIND11_MODULE(farkle_core, m) {
   py::enum_<DieState>(m, "DieState")
       .value("ROLLED", DieState::ROLLED)
@@ -28,16 +32,55 @@ PYBIND11_MODULE(farkle_core, m) {
       .def_readwrite("player_scores", &FarkleEngine::player_scores)
       .def_readwrite("current_player_index",
                      &FarkleEngine::current_player_index)
-      .def_readwrite("dice", &FarkleEngine::dice)
+      .def_property(
+          "dice", [](const FarkleEngine &self) { return self.dice; },
+          [](FarkleEngine &self, const std::vector<Die> &dice) {
+            // Copy in place so the storage behind any dice_view never reallocates
+            if (dice.size() != self.dice.size())
+              throw py::value_error("dice must have exactly " +
+                                    std::to_string(self.dice.size()) + " entries");
+            std::copy(dice.begin(), dice.end(), self.dice.begin());
+          })
       .def_readwrite("turn_score", &FarkleEngine::turn_score)
       .def_readwrite("current_keep_score", &FarkleEngine::current_keep_score)
       .def_readwrite("status", &FarkleEngine::status)
       .def_readwrite("message", &FarkleEngine::message)
+      .def_property_readonly("rolled_mask",
+                             [](const FarkleEngine &self) {
+                               return self.state_mask(DieState::ROLLED);
+                             })
+      .def_property_readonly("kept_mask",
+                             [](const FarkleEngine &self) {
+                               return self.state_mask(DieState::KEPT);
+                             })
+      .def_property_readonly("banked_mask",
+                             [](const FarkleEngine &self) {
+                               return self.state_mask(DieState::BANKED);
+                             })
       .def("roll", &FarkleEngine::roll)
       .def("toggle_keep", &FarkleEngine::toggle_keep)
+      .def("apply_keep_mask", &FarkleEngine::apply_keep_mask)
+      .def("legal_action_masks", &FarkleEngine::legal_action_masks)
       .def("bank", &FarkleEngine::bank)
       .def("pass_turn", &FarkleEngine::pass_turn)
       .def("recalc_keep_score", &FarkleEngine::recalc_keep_score)
+      .def("dice_view",
+           [](py::object self_obj) {
+             // Zero-copy, read-only record view of the dice vector. The view keeps
+             // the engine alive; the vector is sized once in the constructor and the
+             // dice setter refuses length changes, so its storage does not move.
+             auto &self = self_obj.cast<FarkleEngine &>();
+             py::dtype die_dtype(py::make_tuple("id", "value", "state"),
+                                 py::make_tuple("i4", "i4", "i4"),
+                                 py::make_tuple(offsetof(Die, id), offsetof(Die, value),
+                                                offsetof(Die, state)),
+                                 sizeof(Die));
+             py::array view(die_dtype, {static_cast<py::ssize_t>(self.dice.size())},
+                            {static_cast<py::ssize_t>(sizeof(Die))}, self.dice.data(),
+                            self_obj);
+             view.attr("setflags")(py::arg("write") = false);
+             return view;
+           })
       .def("evaluate_scoring", [](FarkleEngine &self, std::vector<int> values) {
         return self.evaluate_scoring(values).score;
       });
@@ -1,9 +1,13 @@
 #include <vector>
 #include <numeric>
 #include <algorithm>
+#include <cstdint>
+#include <array>
 #include <random>
-#include <map>
+#include <stdexcept>
 #include <string>
+#include <unordered_map>
+#include <utility>
 
 enum class DieState { ROLLED, KEPT, BANKED };
 enum class GameStatus { ROLLING, FARKLE, BUST, WIN };
@@ -18,6 +22,30 @@ struct ScoringResult {
     int score;
 };
 
+// Points for `count` dice showing `face`: three or more of a kind score
+// base * 2^(count - 3), otherwise only single 1s (100) and 5s (50) count.
+constexpr int face_score(int face, int count) {
+    if (count >= 3) return (face == 1 ? 1000 : face * 100) * (1 << (count - 3));
+    if (face == 1) return count * 100;
+    if (face == 5) return count * 50;
+    return 0;
+}
+
+constexpr int MAX_DICE = 6;
+
+// FACE_SCORES[face][count] for every face/count a six-dice roll can produce
+constexpr std::array<std::array<int, MAX_DICE + 1>, 7> make_face_scores() {
+    std::array<std::array<int, MAX_DICE + 1>, 7> table{};
+    for (int face = 1; face <= 6; ++face) {
+        for (int count = 0; count <= MAX_DICE; ++count) {
+            table[face][count] = face_score(face, count);
+        }
+    }
+    return table;
+}
+
+constexpr auto FACE_SCORES = make_face_scores();
+
 class FarkleEngine {
 public:
     std::vector<int> player_scores;
@@ -64,11 +92,11 @@ public:
         }
 
         // 3. Roll
-        std::uniform_int_distribution<> dis(1, 6);
         std::vector<int> rolled_values;
+        rolled_values.reserve(dice.size());
         for (auto& d : dice) {
             if (d.state == DieState::ROLLED) {
-                d.value = dis(gen);
+                d.value = die_dist(gen);
                 rolled_values.push_back(d.value);
             }
         }
@@ -84,28 +112,27 @@ public:
     }
 
     bool has_scoring_potential(const std::vector<int>& values) {
-        std::map<int, int> counts;
-        for (int v : values) counts[v]++;
-        if (counts[1] > 0 || counts[5] > 0) return true;
-        for (auto const& [val, count] : counts) {
-            if (count >= 3) return true;
-        }
-        return false;
+        // Pack the per-face counts into 3-bit fields (face 1 in bits 0-2, ...). Six dice
+        // never overflow a field, so every check below is a mask on one integer.
+        uint32_t packed = 0;
+        for (int v : values) packed += 1u << (3 * (v - 1));
+        constexpr uint32_t FIELD_LOW_BITS = 0b001001001001001001;
+        constexpr uint32_t ONES_AND_FIVES = 0b111u | (0b111u << 12);
+        // A field holds >= 3 when its high bit is set or both low bits are
+        uint32_t triples = ((packed >> 2) | ((packed >> 1) & packed)) & FIELD_LOW_BITS;
+        return (triples | (packed & ONES_AND_FIVES)) != 0;
     }
 
     ScoringResult evaluate_scoring(const std::vector<int>& values) {
-        std::map<int, int> counts;
-        for (int v : values) counts[v]++;
+        std::array<int, 7> counts{};
+        for (int v : values) {
+            if (v >= 1 && v <= 6) counts[v]++;
+        }
         int score = 0;
         for (int i = 1; i <= 6; ++i) {
             int count = counts[i];
-            if (count >= 3) {
-                int base = (i == 1 ? 1000 : i * 100);
-                score += base * (1 << (count - 3));
-                count = 0;
-            }
-            if (i == 1) score += count * 100;
-            if (i == 5) score += count * 50;
+            // Only hand-built value lists can exceed six of a face
+            score += count <= MAX_DICE ? FACE_SCORES[i][count] : face_score(i, count);
         }
         return {score};
     }
@@ -151,6 +178,76 @@ public:
         recalc_keep_score();
     }
 
+    // Bit i is set when dice[i] is in `state`
+    int state_mask(DieState state) const {
+        int mask = 0;
+        for (size_t i = 0; i < dice.size(); ++i) {
+            if (dice[i].state == state) mask |= 1 << i;
+        }
+        return mask;
+    }
+
+    // Applies a keep mask the way FarkleEnv resolves an action: a set bit tries to keep
+    // that ROLLED die, a clear bit un-keeps a KEPT one. Returns {newly_kept, illegal}.
+    std::pair<int, int> apply_keep_mask(int mask) {
+        int newly_kept = 0;
+        int illegal = 0;
+        for (size_t i = 0; i < dice.size(); ++i) {
+            DieState state = dice[i].state;
+            if ((mask >> i) & 1) {
+                if (state == DieState::BANKED) {
+                    illegal++;
+                } else if (state == DieState::ROLLED) {
+                    toggle_keep(dice[i].id);
+                    if (dice[i].state == DieState::KEPT) newly_kept++;
+                    else illegal++;
+                }
+            } else if (state == DieState::KEPT) {
+                toggle_keep(dice[i].id);
+            }
+        }
+        return {newly_kept, illegal};
+    }
+
+    // Bit m of .first (.second) is set when FarkleEnv's ROLL (BANK) action with keep
+    // mask m would be penalty-free from the current state. The engine is left untouched.
+    // Results are memoised per legal_masks_key(), shared by all engines.
+    std::pair<uint64_t, uint64_t> legal_action_masks() {
+        // 2^6 keep masks fill the 64-bit results and 13^6 codes fit the 32-bit key
+        static_assert(MAX_DICE <= 6, "legal_action_masks supports at most 6 dice");
+        if (dice.size() > static_cast<size_t>(MAX_DICE)) {
+            throw std::length_error("legal_action_masks supports at most 6 dice");
+        }
+        // Out-of-range faces would alias other codes in legal_masks_key and poison the cache
+        for (const auto& d : dice) {
+            if (d.value < 1 || d.value > 6) {
+                throw std::invalid_argument("legal_action_masks needs dice values in 1-6");
+            }
+        }
+        static std::unordered_map<uint32_t, std::pair<uint64_t, uint64_t>> cache;
+        const uint32_t key = legal_masks_key();
+        auto it = cache.find(key);
+        if (it == cache.end()) {
+            it = cache.emplace(key, compute_legal_action_masks()).first;
+        }
+        return it->second;
+    }
+
+    // Legality only depends on each die's state, the values of non-banked dice, the game
+    // status and whether there are points to bank, so equivalent positions share a key.
+    uint32_t legal_masks_key() const {
+        uint32_t key = static_cast<uint32_t>(status);
+        key = key * 2 + (turn_score > 0);
+        key = key * 2 + (current_keep_score > 0);
+        for (const auto& d : dice) {
+            // 0: banked, 1-6: rolled value, 7-12: kept value
+            uint32_t code = d.state == DieState::BANKED ? 0
+                          : d.value + (d.state == DieState::KEPT ? 6 : 0);
+            key = key * 13 + code;
+        }
+        return key;
+    }
+
     void recalc_keep_score() {
         std::vector<int> kept_values;
         for (const auto& d : dice) {
@@ -184,6 +281,27 @@ public:
     }
 
 private:
+    std::pair<uint64_t, uint64_t> compute_legal_action_masks() {
+        const std::vector<Die> saved_dice = dice;
+        const int saved_keep_score = current_keep_score;
+        uint64_t roll_ok = 0;
+        uint64_t bank_ok = 0;
+        const int n_masks = 1 << dice.size();
+        for (int m = 0; m < n_masks; ++m) {
+            auto [newly_kept, illegal] = apply_keep_mask(m);
+            if (illegal == 0) {
+                bool none_rolled = state_mask(DieState::ROLLED) == 0;
+                if (newly_kept > 0 || none_rolled) roll_ok |= 1ull << m;
+                if (current_keep_score > 0 || turn_score > 0) bank_ok |= 1ull << m;
+            }
+            // Restore in place so the dice storage (and any dice_view) never moves
+            std::copy(saved_dice.begin(), saved_dice.end(), dice.begin());
+            current_keep_score = saved_keep_score;
+        }
+        return {roll_ok, bank_ok};
+    }
+
     std::random_device rd;
     std::mt19937 gen;
+    std::uniform_int_distribution<int> die_dist{1, 6};
 };
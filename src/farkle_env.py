@@ -1,14 +1,35 @@
+import functools
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
 import farkle_core
 
+# Per-feature observation scale (see the layout in FarkleEnv.__init__); multiplying by
+# precomputed reciprocals replaces sixteen divisions per step
+_OBS_SCALE = np.array([1 / 6.0] * 6 + [1 / 2.0] * 6 + [1 / 10000.0] * 4, dtype=np.float32)
+
+# Enum members resolved once instead of via attribute chains on every step
+_FARKLE = farkle_core.GameStatus.FARKLE
+_WIN = farkle_core.GameStatus.WIN
+
+@functools.lru_cache(maxsize=4096)
+def _unpack_action_bits(roll_bits, bank_bits):
+    # Only a few thousand distinct (roll, bank) bitmask pairs occur in play, so the
+    # unpacked 128-entry masks are shared read-only arrays
+    bits = np.array([roll_bits, bank_bits], dtype="<u8")
+    mask = np.unpackbits(bits.view(np.uint8), bitorder="little").astype(np.bool_)
+    mask.flags.writeable = False
+    return mask
+
 class FarkleEnv(gym.Env):
     metadata = {"render_modes": ["human"]}
 
     def __init__(self, render_mode=None, illegal_action_penalty=10.0):
         super(FarkleEnv, self).__init__()
         self.engine = farkle_core.FarkleEngine(num_players=2)
+        # Live (id, value, state) record view of the engine's dice; tracks every roll/keep
+        self._dice = self.engine.dice_view()
+        self._obs_buf = np.zeros(16, dtype=np.float32)
         self.illegal_action_penalty = illegal_action_penalty
         
         # Observation Space:
@@ -29,21 +50,41 @@ class FarkleEnv(gym.Env):
         # - 64-127: Toggle keep for bitmask and then BANK
         self.action_space = spaces.Discrete(128)
 
+    def set_illegal_action_penalty(self, penalty):
+        self.illegal_action_penalty = penalty
+
+    def get_legal_actions(self):
+        """Boolean mask over the 128 actions, True where step() applies no illegal-move penalty."""
+        return _unpack_action_bits(*self.engine.legal_action_masks())
+
+    # Name expected by sb3-contrib's MaskablePPO
+    action_masks = get_legal_actions
+
     def _get_obs(self):
-        obs = np.zeros(16, dtype=np.float32)
-        for i, d in enumerate(self.engine.dice):
-            obs[i] = d.value / 6.0
-            obs[i + 6] = float(int(d.state)) / 2.0
+        # Filled in place: the array returned by step() is overwritten by the next step
+        # (SB3 vec envs copy it into their own buffers before stepping again)
+        engine = self.engine
+        obs = self._obs_buf
+        # Copy all dice straight out of the engine's memory instead of looping over Die objects
+        obs[0:6] = self._dice["value"]
+        obs[6:12] = self._dice["state"]
         
-        obs[12] = self.engine.turn_score / 10000.0
-        obs[13] = self.engine.current_keep_score / 10000.0
-        obs[14] = self.engine.player_scores[self.engine.current_player_index] / 10000.0
-        obs[15] = self.engine.player_scores[(self.engine.current_player_index + 1) % 2] / 10000.0
+        # player_scores is copied out of C++ on every access, so read it once
+        scores = engine.player_scores
+        me = engine.current_player_index
+        obs[12] = engine.turn_score
+        obs[13] = engine.current_keep_score
+        obs[14] = scores[me]
+        obs[15] = scores[(me + 1) % 2]
+        obs *= _OBS_SCALE
         return obs
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
         self.engine = farkle_core.FarkleEngine(num_players=2)
+        self._dice = self.engine.dice_view()
+        # Fresh buffer per episode, so a terminal observation is not clobbered by the reset one
+        self._obs_buf = np.zeros(16, dtype=np.float32)
         return self._get_obs(), {}
 
     def step(self, action):
@@ -60,30 +101,14 @@ class FarkleEnv(gym.Env):
         reward = 0
         terminated = False
         truncated = False
-        info = {"legal_move": True}
+        # Every step reports the same keys so metric callbacks can index instead of probing
+        info = {"legal_move": True, "turn_ended": False, "turn_points": 0, "farkle": False, "win": False}
 
-        # Validate and apply keeps
-        newly_kept_count = 0
-        illegal_action_penalty = 0
-        
-        # Apply mask: for each bit, if set, try to keep that die
-        for i in range(6):
-            target_kept = (mask >> i) & 1
-            current_state = self.engine.dice[i].state
-            
-            if target_kept:
-                if current_state == farkle_core.DieState.BANKED:
-                    illegal_action_penalty += self.illegal_action_penalty
-                    info["legal_move"] = False
-                elif current_state == farkle_core.DieState.ROLLED:
-                    self.engine.toggle_keep(i)
-                    if self.engine.dice[i].state == farkle_core.DieState.KEPT:
-                        newly_kept_count += 1
-                    else:
-                        illegal_action_penalty += self.illegal_action_penalty
-                        info["legal_move"] = False
-            elif not target_kept and current_state == farkle_core.DieState.KEPT:
-                self.engine.toggle_keep(i)
+        # Validate and apply keeps: a set bit tries to keep that die, a clear bit un-keeps it
+        newly_kept_count, illegal_dice = self.engine.apply_keep_mask(mask)
+        illegal_action_penalty = illegal_dice * self.illegal_action_penalty
+        if illegal_dice:
+            info["legal_move"] = False
         
         # Now perform the action
         points_this_turn = 0
@@ -94,10 +119,11 @@ class FarkleEnv(gym.Env):
             else:
                 points_this_turn = self.engine.turn_score + self.engine.current_keep_score
                 self.engine.bank()
+                info["turn_ended"] = True
                 info["turn_points"] = points_this_turn
         else: # ROLL
             # Must keep at least one new scoring die OR all remaining dice are scoring (Hot Hand)
-            all_scoring = all(d.state != farkle_core.DieState.ROLLED for d in self.engine.dice)
+            all_scoring = self.engine.rolled_mask == 0
             if newly_kept_count == 0 and not all_scoring:
                 illegal_action_penalty += self.illegal_action_penalty
                 info["legal_move"] = False
@@ -107,18 +133,19 @@ class FarkleEnv(gym.Env):
         reward -= illegal_action_penalty
 
         # Check for Farkle or Win
-        if self.engine.status == farkle_core.GameStatus.FARKLE:
+        status = self.engine.status
+        if status == _FARKLE:
             reward -= 0.5 # Small penalty for farkle
             info["farkle"] = True
+            info["turn_ended"] = True
             info["turn_points"] = 0
             self.engine.pass_turn() # Move to next player
-        elif self.engine.status == farkle_core.GameStatus.WIN:
+        elif status == _WIN:
             reward = 10.0 # Reward for winning
             info["win"] = True
             terminated = True
         
-        # Reward for scoring (normalized)
-        if points_this_turn > 0:
-            reward += points_this_turn / 1000.0
+        # Reward for scoring (normalized); zero when nothing was banked
+        reward += points_this_turn / 1000.0
 
         return self._get_obs(), reward, terminated, truncated, info
@@ -105,5 +105,42 @@ def test_failure_point_banked_in_mask():
     
     api.model = original_model
 
+def test_mask_maps_to_dice_ids():
+    """Mask bits address dice by ID; bits for IDs not present in the state are dropped."""
+    dice = [Die(id=i, value=1, state="rolled") for i in (0, 2, 3)]
+    players = [PlayerInfo(name="P", score=0, isMyTurn=True)]
+    state = GameState(message="", status="", turnScore=0, currentKeepScore=0, dice=dice, players=players)
+    
+    import api
+    original_model = api.model
+    api.model = MagicMock()
+    api.model.predict.return_value = (0b000111, None) # mask=7 -> IDs 0, 1, 2
+    
+    import asyncio
+    move = asyncio.run(api.get_move(state))
+    
+    assert move.keepDiceIds == [0, 2]
+    
+    api.model = original_model
+
+def test_exported_policy_matches_predict():
+    """The traced actor used by /move must pick the same action as deterministic model.predict."""
+    import os
+    import torch
+    import api
+    from stable_baselines3 import PPO
+    
+    if not os.path.exists(api.MODEL_PATH):
+        pytest.skip("No checkpoint available")
+    model = PPO.load(api.MODEL_PATH, device="cpu")
+    policy = api.export_policy(model)
+    
+    rng = np.random.default_rng(0)
+    for obs in rng.random((200, 16), dtype=np.float32):
+        expected, _ = model.predict(obs, deterministic=True)
+        with torch.no_grad():
+            action = int(policy(torch.from_numpy(obs).unsqueeze(0)).argmax(-1))
+        assert action == int(expected)
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -1,6 +1,7 @@
 import sys
 import os
-import random
+import numpy as np
+import pytest
 
 # Add src to sys.path
 sys.path.append(os.path.join(os.getcwd(), "src"))
@@ -8,13 +9,15 @@ import farkle_core
 
 def ts_evaluate_scoring(values):
     """Python implementation of evaluateScoring from farkle-engine.ts"""
-    counts = {}
+    # Faces are 1-6, so a fixed 7-slot list replaces the dict counter
+    counts = [0] * 7
     for v in values:
-        counts[v] = counts.get(v, 0) + 1
+        if 1 <= v <= 6:
+            counts[v] += 1
     
     score = 0
     for i in range(1, 7):
-        count = counts.get(i, 0)
+        count = counts[i]
         if count >= 3:
             base = 1000 if i == 1 else i * 100
             multiplier = 1 << (count - 3)
@@ -24,24 +27,112 @@ def ts_evaluate_scoring(values):
         if i == 5: score += count * 50
     return score
 
+# Per-face constants for the vectorised scorer (faces 1-6)
+_FACES = np.arange(1, 7)
+_TRIPLE_BASE = np.where(_FACES == 1, 1000, _FACES * 100)
+_SINGLE_POINTS = np.array([100, 0, 0, 0, 50, 0])
+
+def ts_evaluate_scoring_batch(dice):
+    """ts_evaluate_scoring over every row of an (N, k) dice matrix at once; 0 marks an empty slot."""
+    dice = np.asarray(dice)
+    counts = (dice[:, :, None] == _FACES).sum(axis=1)
+    triples = counts >= 3
+    multiplier = np.left_shift(1, np.where(triples, counts - 3, 0))
+    return np.where(triples, _TRIPLE_BASE * multiplier, counts * _SINGLE_POINTS).sum(axis=1)
+
 def test_scoring_parity():
     engine = farkle_core.FarkleEngine()
     print("Testing scoring parity...")
     
-    # 1000 random test cases
-    for _ in range(1000):
-        length = random.randint(1, 6)
-        values = [random.randint(1, 6) for _ in range(length)]
-        
-        cpp_score = engine.evaluate_scoring(values)
-        ts_score = ts_evaluate_scoring(values)
-        
-        if cpp_score != ts_score:
-            print(f"❌ FAIL: {values} -> CPP: {cpp_score}, TS: {ts_score}")
-            return False
-            
+    # 1000 random test cases of 1-6 dice, drawn in one call; unused slots are zeroed
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(1, 7, 1000)
+    rolls = rng.integers(1, 7, (1000, 6))
+    rolls[np.arange(6) >= lengths[:, None]] = 0
+    
+    # Reference scores for the whole batch in one vectorised pass
+    ts_scores = ts_evaluate_scoring_batch(rolls).tolist()
+    cpp_scores = [engine.evaluate_scoring(row[row > 0].tolist()) for row in rolls]
+    mismatches = [i for i, (cpp, ts) in enumerate(zip(cpp_scores, ts_scores)) if cpp != ts]
+    first = mismatches[0] if mismatches else None
+    assert cpp_scores == ts_scores, (
+        f"{len(mismatches)} mismatches, first: {rolls[first][rolls[first] > 0].tolist()} "
+        f"-> CPP: {cpp_scores[first]}, TS: {ts_scores[first]}"
+    )
     print("✅ Scoring parity check passed.")
-    return True
+
+def test_batch_reference_scorer():
+    """The vectorised reference scorer must agree with the scalar port on every roll of up to 6 dice."""
+    import itertools
+    for length in range(1, 7):
+        rolls = np.zeros((6 ** length, 6), dtype=np.int64)
+        rolls[:, :length] = list(itertools.product(range(1, 7), repeat=length))
+        expected = [ts_evaluate_scoring(row[:length].tolist()) for row in rolls]
+        assert ts_evaluate_scoring_batch(rolls).tolist() == expected
+
+def test_dice_view_tracks_engine():
+    """dice_view() is a live, read-only window onto the engine's dice."""
+    engine = farkle_core.FarkleEngine()
+    view = engine.dice_view()
+    for _ in range(100):
+        engine.pass_turn()
+        assert list(view["id"]) == [d.id for d in engine.dice]
+        assert list(view["value"]) == [d.value for d in engine.dice]
+        assert list(view["state"]) == [int(d.state) for d in engine.dice]
+    assert not view.flags.writeable
+
+    # Resizing would reallocate the storage behind the view, so it is refused
+    with pytest.raises(ValueError):
+        engine.dice = engine.dice + engine.dice[:1]
+    dice = engine.dice
+    dice[0].value = 7 - dice[0].value
+    engine.dice = dice
+    assert view["value"][0] == dice[0].value
+
+def test_state_masks():
+    """rolled/kept/banked_mask set bit i exactly when die i is in that state."""
+    engine = farkle_core.FarkleEngine()
+    for _ in range(100):
+        engine.pass_turn()
+        engine.apply_keep_mask(0b111111)
+        masks = {
+            farkle_core.DieState.ROLLED: engine.rolled_mask,
+            farkle_core.DieState.KEPT: engine.kept_mask,
+            farkle_core.DieState.BANKED: engine.banked_mask,
+        }
+        for i, d in enumerate(engine.dice):
+            for state, mask in masks.items():
+                assert bool((mask >> i) & 1) == (d.state == state)
+
+def test_apply_keep_mask():
+    """Set bits keep ROLLED scoring dice; non-scoring and BANKED dice count as illegal."""
+    engine = farkle_core.FarkleEngine()
+    dice = engine.dice
+    for d, value in zip(dice, [1, 2, 3, 4, 6, 6]):
+        d.value = value
+        d.state = farkle_core.DieState.ROLLED
+    dice[5].state = farkle_core.DieState.BANKED
+    engine.dice = dice
+    engine.status = farkle_core.GameStatus.ROLLING
+    
+    newly_kept, illegal = engine.apply_keep_mask(0b100011)
+    assert (newly_kept, illegal) == (1, 2)
+    assert engine.dice[0].state == farkle_core.DieState.KEPT
+    assert engine.current_keep_score == 100
+    
+    # Clearing the bit again un-keeps the die
+    assert engine.apply_keep_mask(0) == (0, 0)
+    assert engine.dice[0].state == farkle_core.DieState.ROLLED
+
+def test_legal_action_masks_rejects_bad_values():
+    """Faces outside 1-6 would alias other dice in the shared mask cache, so they raise."""
+    engine = farkle_core.FarkleEngine()
+    for value in (0, 7):
+        dice = engine.dice
+        dice[0].value = value
+        engine.dice = dice
+        with pytest.raises(ValueError):
+            engine.legal_action_masks()
 
 def test_validation_parity():
     """
@@ -78,10 +169,8 @@ def test_validation_parity():
     
     # This matches exactly.
     print("✅ Validation rules logic comparison passed.")
-    return True
 
 if __name__ == "__main__":
-    s = test_scoring_parity()
-    v = test_validation_parity()
-    if not (s and v):
-        sys.exit(1)
+    # A failed assert exits non-zero
+    test_scoring_parity()
+    test_validation_parity()
@@ -0,0 +1,29 @@
+import sys
+import os
+import numpy as np
+
+# Add src to sys.path
+sys.path.append(os.path.join(os.getcwd(), "src"))
+from farkle_env import FarkleEnv
+
+def test_legal_actions_match_step():
+    """get_legal_actions() must agree with the legal_move flag step() reports, without touching the game."""
+    env = FarkleEnv()
+    env.reset()
+    rng = np.random.default_rng(0)
+    
+    for _ in range(2000):
+        dice_before = env.engine.dice_view().copy()
+        legal = env.get_legal_actions()
+        assert legal.shape == (128,)
+        assert np.array_equal(env.engine.dice_view(), dice_before)
+        
+        # Mostly play legal moves so games progress, but probe illegal ones too
+        if legal.any() and rng.random() < 0.8:
+            action = int(rng.choice(np.flatnonzero(legal)))
+        else:
+            action = int(rng.integers(128))
+        _, _, terminated, _, info = env.step(action)
+        assert info["legal_move"] == legal[action]
+        if terminated:
+            env.reset()